@@ -0,0 +1,70 @@
+"""Confere se o StreamingSegmenter dá o mesmo resultado que segment_detections.
+
+Gera vídeos sintéticos (trechos com rosto, lacunas de vários tamanhos e ruído),
+passa as detecções frame a frame pelo segmentador incremental e compara os
+segmentos emitidos (add + finish, ordenados pelo índice) com o resultado em lote.
+Rode depois de mexer nas regras de agrupamento ou em FINALIZE_GAP:
+
+    python check_segmenter.py
+    python check_segmenter.py --videos 2000 --frames 3600 --gap 6
+"""
+import random
+import argparse
+
+from cut_videos_with_faces import FINALIZE_GAP, MIN_FACE_FRAMES, StreamingSegmenter, segment_detections
+
+
+def random_detections(rng, frames, gap):
+    """Detecções com trechos longos, lacunas ao redor de `gap` e trechos ruidosos."""
+    detections = []
+    size = rng.randint(0, frames)
+    while len(detections) < size:
+        kind = rng.random()
+        if kind < 0.3:
+            detections += [True] * rng.randint(1, 60)
+        elif kind < 0.6:
+            detections += [False] * rng.randint(1, gap + 10)
+        elif kind < 0.8:
+            detections += [rng.random() < 0.6 for _ in range(rng.randint(1, 30))]
+        else:
+            # Lacunas no limite de fechamento de um trecho
+            detections += [False] * rng.choice([gap - 1, gap, gap + 1, rng.randint(20, 80)])
+    return detections
+
+def check(videos, frames, gap, seed):
+    """Retorna (vídeos divergentes, segmentos emitidos antes do finish, total de segmentos)."""
+    rng = random.Random(seed)
+    mismatches = early = total = 0
+    for _ in range(videos):
+        detections = random_detections(rng, frames, gap)
+        segmenter = StreamingSegmenter(min_length=MIN_FACE_FRAMES, finalize_gap=gap)
+        emitted = []
+        for detected in detections:
+            emitted += segmenter.add(detected)
+        early += len(emitted)
+        emitted += segmenter.finish()
+
+        expected = segment_detections(detections, min_length=MIN_FACE_FRAMES)
+        total += len(expected)
+        indexes = sorted(index for index, _ in emitted)
+        if indexes != list(range(len(expected))) or [segment for _, segment in sorted(emitted)] != expected:
+            mismatches += 1
+            if mismatches <= 3:
+                print(f"Mismatch ({len(detections)} frames): {sorted(emitted)[:6]} != {expected[:6]}")
+    return mismatches, early, total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare StreamingSegmenter with segment_detections')
+    parser.add_argument('--videos', type=int, default=600)
+    parser.add_argument('--frames', type=int, default=3600, help='maximum frames per video')
+    parser.add_argument('--gap', type=int, default=FINALIZE_GAP)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    mismatches, early, total = check(args.videos, args.frames, args.gap, args.seed)
+    print(f"gap {args.gap}: {mismatches} mismatches | {early}/{total} segments emitted before finish")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -4,8 +4,9 @@ from datetime import timedelta
 import shutil
 import subprocess
 import csv
+import bisect
 import logging
-from datetime import datetime
+from concurrent.futures import wait
 
 import cv2
 import mediapipe as mp
@@ -14,42 +15,55 @@ from moviepy.editor import VideoFileClip
 import boto3
 from decouple import config
 
+from downloads_index import safe_title, youtube_id_from_url
+from encode_scheduler import EncodeScheduler
+from logging_setup import ProgressLog, verbose_log
+from media_catalog import MediaCatalog
+
 # Nome do arquivo CSV
 CSV_FILE = 'links.csv'  # ajuste para o nome do seu arquivo
 DOWNLOADS_PATH = 'downloads'
 S3_BUCKET_PARTS = 'pregnants-parts'
 
-# === Configuração de Logging ===
-
-# Cria diretório de logs (se não existir)
-os.makedirs("logs", exist_ok=True)
-
-# Gera nome do arquivo de log com data e hora atual
-log_filename = datetime.now().strftime("logs/%Y-%m-%d_%H-%M-%S.log")
-
-# Configuração de logging com arquivo separado por execução
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    handlers=[
-        logging.FileHandler(log_filename, mode='a', encoding='utf-8'),
-        logging.StreamHandler()
-    ],
-    force=True 
-)
-
-def extract_frames_with_timestamps(video_path, output_folder="frames", interval_sec=1):
+# Modo de corte: 'auto' copia o stream (sem reencodar) quando o vídeo já é H.264
+# 1280x720 e há keyframe perto do início do trecho; 'exact' sempre reencoda.
+CUT_MODE = 'auto'
+KEYFRAME_TOLERANCE = 1.0  # segundos
+
+# Parâmetros das partes; o pipeline inclui todos na fingerprint da etapa segment
+FRAME_INTERVAL_SEC = 1  # um frame analisado a cada N segundos
+MIN_FACE_FRAMES = 4  # frames seguidos com rosto para formar um trecho
+MAX_PART_FRAMES = 21  # tamanho máximo de uma parte (split_tuples)
+PART_WIDTH, PART_HEIGHT = 1280, 720
+
+# Zeros seguidos (frames sem rosto) para o segmentador incremental fechar um trecho.
+# group_sequences só junta trechos separados por lacunas com no máximo 4 zeros
+# (os padrões listados têm até 3; a regra de densidade aceita até 4) e
+# adjust_tuples alarga um trecho curto em no máximo 2 frames por lado; 8 zeros
+# seguidos cobrem esse alargamento. check_segmenter.py confere o resultado contra
+# segment_detections (com 5 ou menos já diverge).
+FINALIZE_GAP = 8
+
+def extract_frames_with_timestamps(video_path, output_folder="frames", interval_sec=FRAME_INTERVAL_SEC):
     if os.path.exists(output_folder):
         shutil.rmtree(output_folder)
     os.makedirs(output_folder, exist_ok=True)
     
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
+        cap.release()
         raise ValueError(f"Error opening video: {f'{output_folder}/{video_path}'}")
 
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    try:
+        info = get_media_catalog().get(video_path)
+        fps = info['fps']
+        total_frames = info['frame_count']
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        logging.warning(f"Probe failed, using OpenCV properties: {video_path} {e}")
+        fps = total_frames = None
+    if not fps or total_frames is None:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     duration_sec = total_frames / fps
 
     logging.info(f"Extracting frames every {interval_sec} seconds...")
@@ -58,32 +72,34 @@ def extract_frames_with_timestamps(video_path, output_folder="frames", interval_
     frame_count = 0
     saved_count = 0
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+    try:
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                break
 
-        current_time_sec = frame_count / fps
+            current_time_sec = frame_count / fps
         
-        # Verifica se é o momento de extrair (a cada X segundos)
-        if frame_count % int(fps * interval_sec) == 0:
-            # Formata o timestamp como HH:MM:SS.mmm
-            timestamp = str(timedelta(seconds=current_time_sec))
-            if len(timestamp.split(':')[0]) == 1:  # Verifica se horas tem apenas 1 dígito
-                timestamp = '0' + timestamp
+            # Verifica se é o momento de extrair (a cada X segundos)
+            if frame_count % int(fps * interval_sec) == 0:
+                # Formata o timestamp como HH:MM:SS.mmm
+                timestamp = str(timedelta(seconds=current_time_sec))
+                if len(timestamp.split(':')[0]) == 1:  # Verifica se horas tem apenas 1 dígito
+                    timestamp = '0' + timestamp
             
-            # Nome do arquivo com timestamp
-            filename = f"frame_{timestamp.replace(':', '-')}-{saved_count}.jpg"
-            output_path = os.path.join(output_folder, filename)
+                # Nome do arquivo com timestamp
+                filename = f"frame_{timestamp.replace(':', '-')}-{saved_count}.jpg"
+                output_path = os.path.join(output_folder, filename)
             
-            # Salva o frame
-            cv2.imwrite(output_path, frame)
-            saved_count += 1
-            # logging.info(f"Salvo: {filename}")
+                # Salva o frame
+                cv2.imwrite(output_path, frame)
+                saved_count += 1
+                # logging.info(f"Salvo: {filename}")
 
-        frame_count += 1
+            frame_count += 1
+    finally:
+        cap.release()
 
-    cap.release()
     logging.info(f"Done! {saved_count} frames extracted.")
 
 
@@ -102,7 +118,7 @@ def calculate_required_density(gap_size):
     else:
         return min(0.30 + gap_size * 0.025, 1.0)  # Aumenta 2.5% por elemento a partir de 5
 
-def split_tuples(tuples_list, max_size=21):
+def split_tuples(tuples_list, max_size=MAX_PART_FRAMES):
     result = []
     
     for start, end in tuples_list:
@@ -145,85 +161,209 @@ def adjust_tuples(tuples_list, min_limit=0, max_limit=18):
     
     return adjusted
 
-def find_sequences(frames_folder, min_length=4, max_length=21):
-
+def iter_detections(frames_folder):
+    """Detecta rostos frame a frame (ordem do nome do arquivo) e gera True/False."""
     frames = sorted(os.listdir(frames_folder))
-    len_frames = len(frames)
-    confidence_scores = []
-    detections = []
-    
-    # 1. Coletar todas as confianças e detecções
-    for img in frames:
+    progress = ProgressLog('frames', len(frames))
+    faces = 0
+    for done, img in enumerate(frames, start=1):
         image_path = os.path.join(frames_folder, img)
         detected, confidence = detect_face(image_path)
         if detected:
-            logging.info(f"✅ Face Detected: {confidence:.2%} {image_path}")
+            faces += 1
+            verbose_log.debug("✅ Face Detected: %.2f%% %s", confidence * 100, image_path)
         else:
-            logging.info(f"❌ Not detected: {confidence:.2%} {image_path}")
-        confidence_scores.append(confidence if detected else 0)
-        detections.append(detected)
-    # 1. Identificar todas as sequências de 1's com comprimento mínimo
+            verbose_log.debug("❌ Not detected: %.2f%% %s", confidence * 100, image_path)
+        progress.update(done, lambda: f"{faces / done:.0%} faces")
+        yield detected
+    progress.finish(lambda: f"{faces / max(len(frames), 1):.0%} faces")
+
+def find_face_runs(detections, min_length=MIN_FACE_FRAMES, offset=0):
+    """Sequências de 1's com comprimento mínimo, como tuplas (início, fim) inclusivas."""
     sequences = []
     n = len(detections)
     i = 0
-    
+
     while i < n:
         if detections[i] == 1:
             start = i
             while i < n and detections[i] == 1:
                 i += 1
             end = i - 1
-            if (end - start + 1) >= 4:
-                sequences.append((start, end))
+            if (end - start + 1) >= min_length:
+                sequences.append((start + offset, end + offset))
         else:
             i += 1
-    
+
+    return sequences
+
+def group_sequences(seqs, detections, max_limit):
+    """Agrupa sequências próximas com densidade relativa, divide e ajusta as tuplas."""
+    grouped = [seqs[0]]
+    for current in seqs[1:]:
+        last_start, last_end = grouped[-1]
+        current_start, current_end = current
+
+        gap_start = last_end + 1
+        gap_end = current_start - 1
+        gap_size = gap_end - gap_start + 1
+
+        if gap_size > 0:
+            gap_ones = detections[gap_start:gap_end+1].count(1)
+            density = gap_ones / gap_size
+            required_density = calculate_required_density(gap_size)
+        else:
+            density = 1.0
+
+        if (gap_size <= 0
+            or density >= required_density
+            or detections[gap_start:gap_end+1] in [[0],[0,1,0],[0,1,1,0],[0,1,0,1,0],[0,1,1,1,0]]
+            ):
+            grouped[-1] = (last_start, current_end)
+        else:
+            grouped.append(current)
+
+    grouped = split_tuples(grouped)
+    grouped = adjust_tuples(grouped, max_limit=max_limit)
+
+    return grouped
+
+def segment_detections(detections, min_length=MIN_FACE_FRAMES):
+    # 1. Identificar todas as sequências de 1's com comprimento mínimo
+    sequences = find_face_runs(detections, min_length)
     if not sequences:
         return []
-    
-    # 2. Função para agrupar com densidade relativa
-    def group_sequences(seqs):
-        grouped = [seqs[0]]
-        for current in seqs[1:]:
-            last_start, last_end = grouped[-1]
-            current_start, current_end = current
-            
-            gap_start = last_end + 1
-            gap_end = current_start - 1
-            gap_size = gap_end - gap_start + 1
-            
-            if gap_size > 0:
-                gap_ones = detections[gap_start:gap_end+1].count(1)
-                density = gap_ones / gap_size
-                required_density = calculate_required_density(gap_size)
-            else:
-                density = 1.0
-            
-            if (gap_size <= 0 
-                or density >= required_density 
-                or detections[gap_start:gap_end+1] in [[0],[0,1,0],[0,1,1,0],[0,1,0,1,0],[0,1,1,1,0]]
-                ):
-                grouped[-1] = (last_start, current_end)
-            else:
-                grouped.append(current)
-        
-        grouped = split_tuples(grouped)
-        grouped = adjust_tuples(grouped, max_limit=len_frames)
 
-
-        return grouped
-    
-    # 3. Agrupar iterativamente até não haver mais mudanças
+    # 2. Agrupar iterativamente até não haver mais mudanças
     changed = True
     current_sequences = sequences.copy()
-    
+
     while changed:
-        new_sequences = group_sequences(current_sequences)
+        new_sequences = group_sequences(current_sequences, detections, len(detections))
         changed = len(new_sequences) != len(current_sequences)
         current_sequences = new_sequences
-    
+
     return current_sequences
 
+def find_sequences(frames_folder, min_length=MIN_FACE_FRAMES, max_length=MAX_PART_FRAMES):
+    detections = list(iter_detections(frames_folder))
+    return segment_detections(detections, min_length)
+
+
+class StreamingSegmenter:
+    """Versão incremental de segment_detections.
+
+    Recebe as detecções uma a uma (`add`) e devolve os segmentos que já não podem
+    mudar, como pares (índice, segmento). O índice é a posição do segmento no
+    resultado de segment_detections com todas as detecções; emitidos + `finish`
+    cobrem todos os índices uma única vez.
+
+    Um trecho é fechado depois de `finalize_gap` zeros seguidos: nenhuma regra de
+    densidade agrupa por cima de um intervalo desse tamanho. Como o agrupamento em
+    lote para quando o número *total* de segmentos deixa de mudar, um segmento só é
+    emitido na hora se o valor dele é o mesmo para qualquer número de iterações e se
+    a quantidade de segmentos dos trechos anteriores também não depende disso; os
+    demais esperam o `finish`, que calcula essa contagem global.
+    """
+
+    MAX_ITERATIONS = 1000
+
+    def __init__(self, min_length=MIN_FACE_FRAMES, finalize_gap=FINALIZE_GAP):
+        self.min_length = min_length
+        self.finalize_gap = finalize_gap
+        self.detections = []
+        self.chunk_start = 0
+        self.zeros = 0
+        self.chunks = []  # [{'count0', 'states', 'emitted'}] na ordem do vídeo
+        self.head = 0  # primeiro trecho ainda não emitido por completo
+        self.head_index = 0  # índice global do primeiro segmento de `head`
+
+    def add(self, detected):
+        """Adiciona a detecção do próximo frame e retorna os (índice, segmento) finalizados."""
+        self.detections.append(detected)
+        self.zeros = 0 if detected else self.zeros + 1
+        if self.zeros == self.finalize_gap:
+            self._close_chunk(max_limit=float('inf'))
+            return self._emit_stable()
+        return []
+
+    def finish(self):
+        """Fecha o último trecho e retorna os (índice, segmento) restantes."""
+        self._close_chunk(max_limit=len(self.detections))
+        iterations = self._global_iterations()
+        segments = []
+        first_index = self.head_index
+        for chunk in self.chunks[self.head:]:
+            states = chunk['states']
+            final = states[min(iterations, len(states)) - 1]
+            segments.extend(
+                (first_index + index, segment)
+                for index, segment in enumerate(final)
+                if index not in chunk['emitted']
+            )
+            first_index += len(final)
+        self.head = len(self.chunks)
+        self.head_index = first_index
+        return segments
+
+    def _close_chunk(self, max_limit):
+        chunk_end = len(self.detections)
+        sequences = find_face_runs(
+            self.detections[self.chunk_start:chunk_end], self.min_length, offset=self.chunk_start
+        )
+        self.chunk_start = chunk_end
+        if not sequences:
+            return
+
+        # Estados após 1, 2, ... iterações até um ponto fixo (valores iguais)
+        states = [group_sequences(sequences, self.detections, max_limit)]
+        while len(states) < self.MAX_ITERATIONS:
+            next_state = group_sequences(states[-1], self.detections, max_limit)
+            if next_state == states[-1]:
+                break
+            states.append(next_state)
+        self.chunks.append({'count0': len(sequences), 'states': states, 'emitted': set()})
+
+    def _emit_stable(self):
+        segments = []
+        first_index = self.head_index
+        for position in range(self.head, len(self.chunks)):
+            chunk = self.chunks[position]
+            states = chunk['states']
+            if len(states) >= self.MAX_ITERATIONS:
+                # Sem ponto fixo: valores e índices seguintes só no finish
+                break
+            # Posições com o mesmo segmento em todos os estados não dependem do número de iterações
+            for index in range(min(len(state) for state in states)):
+                if (index not in chunk['emitted']
+                    and all(state[index] == states[0][index] for state in states[1:])
+                    ):
+                    chunk['emitted'].add(index)
+                    segments.append((first_index + index, states[0][index]))
+            if any(len(state) != len(states[0]) for state in states[1:]):
+                # A quantidade deste trecho varia: os índices dos seguintes ainda não são conhecidos
+                break
+            first_index += len(states[0])
+            if position == self.head and len(chunk['emitted']) == len(states[0]):
+                self.head += 1
+                self.head_index = first_index
+        return segments
+
+    def _global_iterations(self):
+        """Número de iterações que segment_detections faria com todas as detecções."""
+        def total(iteration):
+            if iteration == 0:
+                return sum(chunk['count0'] for chunk in self.chunks)
+            return sum(
+                len(chunk['states'][min(iteration, len(chunk['states'])) - 1])
+                for chunk in self.chunks
+            )
+
+        longest = max((len(chunk['states']) for chunk in self.chunks), default=0)
+        for iteration in range(1, longest + 2):
+            if total(iteration) == total(iteration - 1):
+                return iteration
+        return longest + 1
 
 def seconds_to_timestamp(seconds):
     return str(timedelta(seconds=seconds)).split('.')[0].zfill(8)
@@ -239,22 +379,22 @@ def has_consecutive_detections(detections, start, end, min_consecutive=4):
             consecutive = 0
     return False
 
-def video_cut(input, output, start_seconds, end_seconds):
+def video_cut(input, output, start_seconds, end_seconds, threads=None):
     try:
-        video = VideoFileClip(input)
-        
-        if start_seconds < 0 or end_seconds > video.duration:
-            return f"Error: Times must be between 0 and {video.duration:.2f} seconds."
-        if start_seconds >= end_seconds:
-            return "Error: Start time must be less than end time."
-        
-        trecho = video.subclip(start_seconds, end_seconds)
-        
-        out_folder = '/'.join(output.split('/')[:-1])
-        os.makedirs(out_folder, exist_ok=True)
-        trecho.write_videofile(output, codec="libx264", audio_codec="aac")
+        # Fecha o leitor ffmpeg (vídeo e áudio) ao sair, mesmo em caso de erro
+        with VideoFileClip(input) as video:
+            if start_seconds < 0 or end_seconds > video.duration:
+                return f"Error: Times must be between 0 and {video.duration:.2f} seconds."
+            if start_seconds >= end_seconds:
+                return "Error: Start time must be less than end time."
+
+            trecho = video.subclip(start_seconds, end_seconds)
+
+            out_folder = '/'.join(output.split('/')[:-1])
+            os.makedirs(out_folder, exist_ok=True)
+            trecho.write_videofile(output, codec="libx264", audio_codec="aac", threads=threads)
         return "Video cut successfully!"
-    
+
     except Exception as e:
         return f"Error: {str(e)}"
 
@@ -271,8 +411,67 @@ def check_ffmpeg_installed():
         )
     return ffmpeg_path, ffprobe_path
 
-def resize_video(input_path, output_path, width=1280, height=720):
-    """Resize video to 1280x720 by cropping ONLY the top for vertical videos"""
+_media_catalog = None
+
+def get_media_catalog():
+    """Catálogo de ffprobe compartilhado por todas as etapas da execução."""
+    global _media_catalog
+    if _media_catalog is None:
+        _media_catalog = MediaCatalog()
+    return _media_catalog
+
+def get_video_dimensions(input_path):
+    info = get_media_catalog().get(input_path)
+    return info['width'], info['height']
+
+def snap_to_keyframe(seconds, keyframes, tolerance=KEYFRAME_TOLERANCE):
+    """Keyframe mais próximo de `seconds` dentro da tolerância, ou None."""
+    index = bisect.bisect_left(keyframes, seconds)
+    candidates = keyframes[max(index - 1, 0):index + 1]
+    if not candidates:
+        return None
+    nearest = min(candidates, key=lambda keyframe: abs(keyframe - seconds))
+    return nearest if abs(nearest - seconds) <= tolerance else None
+
+def stream_copy_cut(input_path, output_path, keyframe_seconds, end_seconds, start_time=0.0, fps=None, threads=None):
+    """Corta sem reencodar a partir do keyframe em `keyframe_seconds` (pts do arquivo).
+
+    O -ss de entrada é relativo ao início do arquivo (`start_time`) e volta para o
+    keyframe anterior à posição; por isso a posição fica meio frame depois do
+    keyframe, sem arredondar, para não cair no keyframe anterior.
+    """
+    out_folder = '/'.join(output_path.split('/')[:-1])
+    os.makedirs(out_folder, exist_ok=True)
+    seek_seconds = keyframe_seconds - start_time + (0.5 / fps if fps else 0.001)
+    try:
+        ffmpeg_path, _ = check_ffmpeg_installed()
+        cmd = [
+            ffmpeg_path,
+            '-v', 'error',
+            '-ss', str(seek_seconds),
+            '-i', input_path,
+            '-t', str(end_seconds - keyframe_seconds),
+            '-map', '0:v:0',
+            '-map', '0:a?',
+            '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            '-movflags', '+faststart',
+            '-y',
+            output_path
+        ]
+        subprocess.run(cmd, check=True)
+        return True
+
+    except Exception as e:
+        logging.error(f"❌ Error: {str(e)}")
+        return False
+
+def resize_video(input_path, output_path, width=PART_WIDTH, height=PART_HEIGHT, source_size=None, threads=None):
+    """Resize video to 1280x720 by cropping ONLY the top for vertical videos
+
+    `source_size` (largura, altura) evita analisar o arquivo; uma parte cortada
+    tem as mesmas dimensões do vídeo de origem.
+    """
     out_folder = '/'.join(output_path.split('/')[:-1])
     os.makedirs(out_folder, exist_ok=True)
     try:
@@ -282,17 +481,7 @@ def resize_video(input_path, output_path, width=1280, height=720):
             raise FileNotFoundError(f"File not found: {input_path}")
 
         # Obtém dimensões originais
-        cmd_probe = [
-            ffprobe_path,
-            '-v', 'error',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=width,height',
-            '-of', 'csv=p=0',
-            input_path
-        ]
-        
-        original_dims = subprocess.check_output(cmd_probe).decode('utf-8').strip().split(',')
-        original_width, original_height = map(int, original_dims)
+        original_width, original_height = source_size or get_video_dimensions(input_path)
         
         is_vertical = original_height > original_width
 
@@ -320,6 +509,10 @@ def resize_video(input_path, output_path, width=1280, height=720):
             '-y',
             output_path
         ]
+        if threads:
+            # Limita decoder, filtros e encoder ao número de threads do job
+            cmd[1:1] = ['-threads', str(threads), '-filter_threads', str(threads)]
+            cmd[-2:-2] = ['-threads', str(threads)]
         
         # logging.info("Command executed:", " ".join(cmd))
         subprocess.run(cmd, check=True)
@@ -374,67 +567,141 @@ def upload_file_to_s3(bucket_name, local_path, s3_path):
         logging.info(f"Error upload: {str(e)}")
         return False
 
-## TO S3
-jump = False # change to True to continue from last uploaded
-for video_data in list_metadata():
+def cut_part(source_path, output_path, start_seconds, end_seconds, keyframes=(),
+             keyframe_tolerance=KEYFRAME_TOLERANCE, start_time=0.0, fps=None, source_size=None, threads=None):
+    """Gera a parte 1280x720 em `output_path`; por cópia de stream quando possível.
+
+    `keyframes` e `start_time` estão no tempo (pts) do arquivo; `start_seconds` e
+    `end_seconds` contam a partir do primeiro frame, como os timestamps da detecção.
+    """
+    keyframe_start = snap_to_keyframe(start_seconds + start_time, keyframes, keyframe_tolerance)
+    if keyframe_start is not None and keyframe_start < end_seconds + start_time:
+        if stream_copy_cut(source_path, output_path, keyframe_start, end_seconds + start_time,
+                           start_time=start_time, fps=fps, threads=threads):
+            return output_path
+    # Cut
+    cut_output = output_path.replace('_out_1280x720/', '_out/')
+    video_cut(source_path, cut_output, start_seconds, end_seconds, threads=threads)
+    # Resize
+    if resize_video(cut_output, output_path, width=PART_WIDTH, height=PART_HEIGHT, source_size=source_size, threads=threads):
+        return output_path
+    return None
+
+_encode_scheduler = None
+
+def get_encode_scheduler():
+    """Agendador de encodes compartilhado por todos os vídeos da execução."""
+    global _encode_scheduler
+    if _encode_scheduler is None:
+        _encode_scheduler = EncodeScheduler()
+    return _encode_scheduler
+
+def segment_video(video_data, local_filename, videos_folder=DOWNLOADS_PATH,
+                  cut_mode=CUT_MODE, keyframe_tolerance=KEYFRAME_TOLERANCE):
+    """Corta os trechos com rostos do vídeo em partes 1280x720 e retorna os caminhos das partes.
+
+    Os trechos saem do StreamingSegmenter assim que ficam definitivos, então o corte
+    das primeiras partes acontece enquanto a detecção continua nos frames seguintes.
+    """
     folder_id = video_data['id']
-    youtube_id = video_data['url'].split('=')[-1]
+    youtube_id = youtube_id_from_url(video_data['url'])
     video_title = video_data['title']
-    local_filename = f'{video_title} ({youtube_id}).mp4'
-    videos_folder = DOWNLOADS_PATH
-    s3_folder = video_data['id']
-    if jump:
-        cont = '2/Pregnant Mackenzie Huge Twin Belly Compilation | TV (IR4hyRyk_VI)'
-        if f'{folder_id}/{video_title} ({youtube_id})' == cont:
-            jump = False 
-            logging.info(f'Continue after: {cont}')
-        continue
     logging.info(f'Processing: {folder_id}/{video_title} {youtube_id}')
 
+    # Pasta por vídeo: vídeos da mesma playlist compartilham o folder_id
+    frames_folder = f'frames/frames_{youtube_id}'
+    source_path = f'{videos_folder}/{local_filename}'
+
+    # Uma análise por vídeo, reaproveitada por todas as etapas. Vídeos H.264 já em
+    # 1280x720 podem ser cortados por cópia de stream nos keyframes; só para eles
+    # vale ler os pacotes do arquivo inteiro atrás dos keyframes
+    keyframes = []
+    stream_start = 0.0
+    fps = None
+    source_size = None
+    try:
+        catalog = get_media_catalog()
+        info = catalog.get(source_path)
+        stream_start = info['start_time']
+        fps = info['fps']
+        if info['width'] and info['height']:
+            source_size = (info['width'], info['height'])
+        if (cut_mode == 'auto'
+            and info['codec'] == 'h264'
+            and (info['width'], info['height']) == (PART_WIDTH, PART_HEIGHT)
+            ):
+            keyframes = catalog.get(source_path, keyframes=True)['keyframes']
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        logging.warning(f"Probe failed, re-encoding parts: {source_path} {e}")
+
     # Extract frames
-    frames_folder = f'frames/frames_{folder_id}'
     try:
-        extract_frames_with_timestamps(f'{videos_folder}/{local_filename}', output_folder=frames_folder)
+        extract_frames_with_timestamps(source_path, output_folder=frames_folder, interval_sec=FRAME_INTERVAL_SEC)
     except ValueError:
-        try:
-            local_filename = f'{video_title}.mp4'
-            extract_frames_with_timestamps(f'{videos_folder}/{local_filename}', output_folder=frames_folder)
-        except ValueError:
-            try:
-                local_filename = f'{video_title.replace('/','')}.mp4'
-                extract_frames_with_timestamps(f'{videos_folder}/{local_filename}', output_folder=frames_folder)
-            except ValueError:
-                logging.error(f"Error opening video: {f'{folder_id} {videos_folder}/{local_filename}'}")
-                continue
-
-    # Find start-end index of faces
-    subvideos_indexes = find_sequences(frames_folder, min_length=4)
+        logging.error(f"Error opening video: {f'{folder_id} {videos_folder}/{local_filename}'}")
+        return None
+
+    # Find start-end index of faces and cut each part as soon as it is final
+    subvideos_indexes = {}
+    futures = []
+    encoder = get_encode_scheduler()
+
+    def submit(segments):
+        for index, (start_frame, end_frame) in segments:
+            # Um frame analisado a cada FRAME_INTERVAL_SEC segundos
+            start_seconds = start_frame * FRAME_INTERVAL_SEC
+            end_seconds = end_frame * FRAME_INTERVAL_SEC
+            subvideos_indexes[index] = (start_seconds, end_seconds)
+            part_id = index + 1
+            start_time = seconds_to_timestamp(start_seconds)
+            end_time = seconds_to_timestamp(end_seconds)
+            logging.info(f"Video slice {part_id}: {start_seconds:.2f}s to {end_seconds:.2f}s ({start_time} to {end_time})")
+            cut_filename = f'{safe_title(video_title)} ({youtube_id}) {part_id}.mp4'
+            output_path = f's3_folder_out_1280x720/{folder_id}/{cut_filename}'
+            futures.append(encoder.submit(
+                cut_part, source_path, output_path, start_seconds, end_seconds, keyframes, keyframe_tolerance,
+                stream_start, fps, source_size=source_size
+            ))
+
+    try:
+        segmenter = StreamingSegmenter(min_length=MIN_FACE_FRAMES)
+        for detected in iter_detections(frames_folder):
+            submit(segmenter.add(detected))
+        submit(segmenter.finish())
+    finally:
+        # Não deixa encodes pendentes para trás se a detecção falhar
+        wait(futures)
+
     if not subvideos_indexes:
         logging.info(f"No relevant faces found: {folder_id} {videos_folder}/{local_filename}")
-        continue
+        return []
+    subvideos_indexes = [subvideos_indexes[index] for index in sorted(subvideos_indexes)]
     logging.info(f"Video parts with faces: {len(subvideos_indexes)}. Seconds: {subvideos_indexes}")
 
-
-    # Cut video parts, resize and upload
-    for i, (start_seconds, end_seconds) in enumerate(subvideos_indexes):
-        # Cut
-        part_id = i+1
-        start_time = seconds_to_timestamp(start_seconds)
-        end_time = seconds_to_timestamp(end_seconds)
-        logging.info(f"Video slice {part_id}: {start_seconds:.2f}s to {end_seconds:.2f}s ({start_time} to {end_time})")
-        cut_filename = f'{video_title.replace('/', '-')} ({youtube_id}) {part_id}.mp4'
-        cut_output = f's3_folder_out/{folder_id}/{cut_filename}'
-        video_cut(f'{videos_folder}/{local_filename}', cut_output, start_seconds, end_seconds)
-        # Resize
-        resize_input = cut_output
-        resize_output = cut_output.replace('_out/', '_out_1280x720/')
-        resize_video(resize_input, resize_output, width=1280, height=720)
-        # Upload
-        upload_input = resize_output
-        s3_filename = f'{cut_filename}'
-        upload_output = f'{folder_id}/{s3_filename}'
-        upload_file_to_s3(S3_BUCKET_PARTS, upload_input, upload_output)
-        logging.info(f'Upload from {upload_input} to {S3_BUCKET_PARTS} {upload_output}')
+    parts = []
+    failed = 0
+    for future in futures:
+        try:
+            part = future.result()
+        except Exception as e:
+            logging.error(f"Error cutting part: {str(e)}")
+            part = None
+        if part is None:
+            failed += 1
+        else:
+            parts.append(part)
+    if failed:
+        # Sem resultado a etapa é repetida, inclusive as partes que falharam
+        logging.error(f"Failed parts: {failed}/{len(futures)} {folder_id} {videos_folder}/{local_filename}")
+        return None
+    return parts
+
+def upload_part(part_path):
+    folder_id, s3_filename = part_path.split('/')[-2:]
+    upload_output = f'{folder_id}/{s3_filename}'
+    uploaded = upload_file_to_s3(S3_BUCKET_PARTS, part_path, upload_output)
+    logging.info(f'Upload from {part_path} to {S3_BUCKET_PARTS} {upload_output}')
+    return uploaded
 
 
 ## LOCAL
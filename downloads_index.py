@@ -0,0 +1,73 @@
+import os
+import re
+import unicodedata
+
+DOWNLOADS_PATH = 'downloads'
+VIDEO_EXTENSION = '.mp4'
+
+# Sufixo " (youtube_id)" usado nos arquivos renomeados
+YOUTUBE_ID_SUFFIX = re.compile(r'\(([\w-]{11})\)$')
+
+
+def youtube_id_from_url(url):
+    return url.split('=')[-1]
+
+
+def safe_title(title):
+    """Título usável como nome de arquivo: '/' viraria um subdiretório."""
+    return str(title).replace('/', '-')
+
+
+def normalize_title(title):
+    """Normaliza o título para comparar com nomes de arquivos salvos pelo pytubefix,
+    que removem caracteres inválidos como '/', ':' e '?'."""
+    title = unicodedata.normalize('NFKC', str(title)).casefold()
+    return re.sub(r'[\W_]+', '', title)
+
+
+def build_downloads_index(videos_metadata, folder=DOWNLOADS_PATH):
+    """Varre a pasta de downloads uma única vez e mapeia youtube_id -> nome do arquivo.
+
+    Ordem de prioridade:
+    1. "{title} ({youtube_id}).mp4" (id no final do nome)
+    2. "{youtube_id}.mp4"
+    3. Título normalizado ("{title}.mp4", com ou sem '/'), apenas quando não há
+       outro vídeo com o mesmo título
+    """
+    ids_by_title = {}
+    ambiguous_titles = set()
+    known_ids = set()
+    for video_data in videos_metadata:
+        youtube_id = youtube_id_from_url(video_data['url'])
+        known_ids.add(youtube_id)
+        title_key = normalize_title(video_data['title'])
+        if ids_by_title.get(title_key, youtube_id) != youtube_id:
+            ambiguous_titles.add(title_key)
+        ids_by_title[title_key] = youtube_id
+
+    index = {}
+    files_by_title = {}
+    try:
+        entries = list(os.scandir(folder))
+    except FileNotFoundError:
+        return index
+
+    for entry in entries:
+        if not entry.is_file() or not entry.name.endswith(VIDEO_EXTENSION):
+            continue
+        stem = entry.name[:-len(VIDEO_EXTENSION)]
+        match = YOUTUBE_ID_SUFFIX.search(stem)
+        if match:
+            index[match.group(1)] = entry.name
+        elif stem in known_ids:
+            index.setdefault(stem, entry.name)
+        else:
+            files_by_title.setdefault(normalize_title(stem), entry.name)
+
+    for title_key, youtube_id in ids_by_title.items():
+        if youtube_id in index or title_key in ambiguous_titles:
+            continue
+        if title_key in files_by_title:
+            index[youtube_id] = files_by_title[title_key]
+
+    return index
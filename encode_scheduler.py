@@ -0,0 +1,93 @@
+"""Agendador de encodes: limita quantos ffmpeg/moviepy rodam ao mesmo tempo.
+
+O número de jobs simultâneos sai do número de núcleos e do orçamento de memória;
+cada job recebe `threads` = núcleos / jobs, para não disputar CPU. Antes de iniciar
+um job, o agendador espera haver memória livre suficiente (Linux, /proc/meminfo).
+"""
+import os
+import logging
+import threading
+from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_MEMORY_MB = 1024  # memória estimada por encode 1280x720 (ffmpeg + buffers)
+MEMORY_BUDGET_FRACTION = 0.5  # fração da RAM total disponível para encodes
+MEMORY_POLL_SECONDS = 1
+
+
+def total_memory_mb():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def available_memory_mb():
+    try:
+        with open('/proc/meminfo', encoding='utf-8') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+class EncodeScheduler:
+    def __init__(self, max_jobs=None, memory_budget_mb=None, job_memory_mb=JOB_MEMORY_MB):
+        cores = os.cpu_count() or 1
+        if memory_budget_mb is None:
+            total = total_memory_mb()
+            memory_budget_mb = int(total * MEMORY_BUDGET_FRACTION) if total else None
+
+        jobs = max_jobs or max(1, cores // 2)
+        if memory_budget_mb:
+            jobs = min(jobs, max(1, memory_budget_mb // job_memory_mb))
+
+        self.jobs = jobs
+        self.threads = max(1, cores // jobs)
+        self.job_memory_mb = job_memory_mb
+        self._executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='encode')
+        # Limita a fila: quem envia espera em vez de acumular jobs pendentes
+        self._slots = threading.BoundedSemaphore(jobs * 2)
+        self._running = 0
+        self._lock = threading.Lock()
+        logging.info(f"Encode scheduler: {self.jobs} jobs x {self.threads} threads | budget: {memory_budget_mb} MB")
+
+    def submit(self, fn, *args, **kwargs):
+        """Agenda fn(*args, threads=..., **kwargs) e retorna o Future."""
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._run, fn, args, kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _run(self, fn, args, kwargs):
+        self._wait_for_memory()
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, threads=self.threads, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _wait_for_memory(self):
+        while True:
+            available = available_memory_mb()
+            with self._lock:
+                # Sem outros encodes rodando, segue mesmo assim para não travar
+                if available is None or available >= self.job_memory_mb or self._running == 0:
+                    return
+            sleep(MEMORY_POLL_SECONDS)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
@@ -0,0 +1,153 @@
+import os
+import atexit
+import logging
+import logging.handlers
+import threading
+from queue import SimpleQueue
+from time import monotonic
+from datetime import datetime
+
+LOGS_PATH = 'logs'
+SAMPLE_INTERVAL = 5  # segundos entre registros do mesmo tipo (extra={'kind': ...})
+SUMMARY_INTERVAL = 10  # segundos entre resumos de progresso
+PROJECT_LOGGER = 'dataset'  # logs por item (DEBUG); só ele fica em DEBUG com --verbose
+
+_listener = None
+_rate_limit_filter = None
+
+# Logs por frame/chunk; o logger raiz fica em INFO para não ligar o DEBUG de
+# botocore, urllib3, TensorFlow etc.
+verbose_log = logging.getLogger(PROJECT_LOGGER)
+
+
+class RateLimitFilter(logging.Filter):
+    """Deixa passar no máximo um registro a cada `interval` segundos por tipo.
+
+    Só afeta registros marcados com extra={'kind': '...'}; os demais passam sempre.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+        self._suppressed = {}
+        self._last_message = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        kind = getattr(record, 'kind', None)
+        if kind is None:
+            return True
+        now = monotonic()
+        with self._lock:
+            last = self._last.get(kind)
+            if last is not None and now - last < self.interval:
+                self._suppressed[kind] = self._suppressed.get(kind, 0) + 1
+                self._last_message[kind] = record.getMessage()
+                return False
+            self._last[kind] = now
+            suppressed = self._suppressed.pop(kind, 0)
+            self._last_message.pop(kind, None)
+        if suppressed:
+            record.msg = f"{record.msg} (+{suppressed} similar)"
+        return True
+
+    def pending(self):
+        """Retorna e zera os suprimidos ainda não relatados: [(kind, quantidade, última mensagem)]."""
+        with self._lock:
+            pending = [
+                (kind, count, self._last_message.get(kind))
+                for kind, count in self._suppressed.items()
+            ]
+            self._suppressed.clear()
+            self._last_message.clear()
+        return pending
+
+
+class ProgressLog:
+    """Resumo periódico de um laço longo, ex.: "frames 1200/3600, 61% faces"."""
+
+    def __init__(self, label, total=None, interval=SUMMARY_INTERVAL):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self._last = monotonic()
+
+    def update(self, done=None, detail=None):
+        """Atualiza o progresso; `detail` pode ser uma função, avaliada só ao registrar."""
+        if done is not None:
+            self.done = done
+        if monotonic() - self._last >= self.interval:
+            self._log(detail)
+
+    def finish(self, detail=None):
+        self._log(detail)
+
+    def _log(self, detail):
+        self._last = monotonic()
+        message = self.label
+        if self.total:
+            message += f" {self.done}/{self.total}"
+        if callable(detail):
+            detail = detail()
+        if detail:
+            message += f", {detail}"
+        logging.info(message)
+
+
+def setup_logging(verbose=False):
+    """Configura o log da execução numa thread em segundo plano (QueueHandler).
+
+    Com `verbose`, os logs por item de `verbose_log` (DEBUG) são registrados; sem ele
+    ficam de fora e os registros marcados com `kind` são limitados por RateLimitFilter.
+    """
+    global _listener, _rate_limit_filter
+    stop_logging()
+
+    # Cria diretório de logs (se não existir)
+    os.makedirs(LOGS_PATH, exist_ok=True)
+
+    # Gera nome do arquivo de log com data e hora atual
+    log_filename = datetime.now().strftime(f"{LOGS_PATH}/%Y-%m-%d_%H-%M-%S.log")
+
+    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    handlers = [
+        logging.FileHandler(log_filename, mode='a', encoding='utf-8'),
+        logging.StreamHandler()
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # Os handlers de arquivo/console rodam na thread do listener, fora dos laços
+    log_queue = SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    _rate_limit_filter = None if verbose else RateLimitFilter()
+    if _rate_limit_filter:
+        queue_handler.addFilter(_rate_limit_filter)
+
+    verbose_log.setLevel(logging.DEBUG if verbose else logging.INFO)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",  # formatação final fica com os handlers do listener
+        handlers=[queue_handler],
+        force=True
+    )
+    _listener = logging.handlers.QueueListener(log_queue, *handlers)
+    _listener.start()
+    atexit.register(stop_logging)
+    return log_filename
+
+def stop_logging():
+    """Relata os registros suprimidos pendentes, descarrega a fila de logs e fecha os handlers."""
+    global _listener, _rate_limit_filter
+    if _listener is None:
+        return
+    if _rate_limit_filter:
+        for kind, count, message in _rate_limit_filter.pending():
+            logging.info(f"{count} similar '{kind}' messages suppressed (last: {message})")
+        _rate_limit_filter = None
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
@@ -0,0 +1,117 @@
+"""Catálogo persistente de informações de mídia (ffprobe) por arquivo.
+
+Cada arquivo é analisado uma vez: fps, duração, início, dimensões, codec, número de frames
+e, quando pedido, os timestamps dos keyframes. O resultado fica numa base SQLite
+ao lado de links.csv, com chave caminho + tamanho + mtime; se o arquivo mudar,
+é analisado de novo.
+"""
+import os
+import json
+import sqlite3
+import threading
+import subprocess
+from contextlib import closing
+
+CATALOG_FILE = 'media_catalog.db'
+
+
+def parse_rate(rate):
+    """Converte '30000/1001' em 29.97. Retorna None se inválido."""
+    try:
+        numerator, _, denominator = str(rate).partition('/')
+        value = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return value or None
+
+def probe_media(path, keyframes=False, ffprobe_path='ffprobe'):
+    """Uma única chamada ao ffprobe com stream, formato e (opcional) pacotes de vídeo."""
+    entries = 'stream=codec_name,width,height,avg_frame_rate,r_frame_rate,nb_frames:format=duration,start_time'
+    if keyframes:
+        # Flags dos pacotes: não precisa decodificar o vídeo
+        entries += ':packet=pts_time,flags'
+    cmd_probe = [
+        ffprobe_path,
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', entries,
+        '-of', 'json',
+        path
+    ]
+    data = json.loads(subprocess.check_output(cmd_probe).decode('utf-8'))
+
+    streams = data.get('streams') or []
+    if not streams:
+        raise ValueError(f"No video stream: {path}")
+    stream = streams[0]
+    fps = parse_rate(stream.get('avg_frame_rate')) or parse_rate(stream.get('r_frame_rate'))
+    duration = data.get('format', {}).get('duration')
+    duration = float(duration) if duration not in (None, 'N/A') else None
+    # Os pts (e os keyframes) começam em start_time; o -ss do ffmpeg conta a partir dele
+    start_time = data.get('format', {}).get('start_time')
+    start_time = float(start_time) if start_time not in (None, 'N/A') else 0.0
+    nb_frames = stream.get('nb_frames')
+    if str(nb_frames).isdigit():
+        frame_count = int(nb_frames)
+    elif fps and duration:
+        frame_count = round(fps * duration)
+    else:
+        frame_count = None
+
+    info = {
+        'fps': fps,
+        'duration': duration,
+        'start_time': start_time,
+        'width': stream.get('width'),
+        'height': stream.get('height'),
+        'codec': stream.get('codec_name'),
+        'frame_count': frame_count,
+    }
+    if keyframes:
+        info['keyframes'] = sorted(
+            float(packet['pts_time'])
+            for packet in data.get('packets', [])
+            if 'K' in packet.get('flags', '') and packet.get('pts_time') not in (None, 'N/A')
+        )
+    return info
+
+
+class MediaCatalog:
+    def __init__(self, path=CATALOG_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS media (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    info TEXT NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        return closing(conn)
+
+    def get(self, media_path, keyframes=False):
+        """Informações do arquivo, do catálogo ou (se novo/alterado) do ffprobe."""
+        stat = os.stat(media_path)
+        key = os.path.abspath(media_path)
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT size, mtime_ns, info FROM media WHERE path = ?", (key,)
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            info = json.loads(row[2])
+            if not keyframes or 'keyframes' in info:
+                return info
+
+        info = probe_media(media_path, keyframes=keyframes)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO media (path, size, mtime_ns, info) VALUES (?, ?, ?, ?)",
+                (key, stat.st_size, stat.st_mtime_ns, json.dumps(info)),
+            )
+            conn.commit()
+        return info
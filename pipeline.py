@@ -0,0 +1,449 @@
+"""Linha de comando única para todas as etapas do pipeline.
+
+    ingest -> metadata -> download -> rename -> verify -> upload
+                                                verify -> segment -> upload-parts
+
+Cada etapa grava em STATE_FILE (SQLite) a impressão digital (fingerprint) das entradas de
+cada item processado com sucesso e as saídas geradas. Na execução seguinte só
+roda de novo os itens cujas entradas mudaram ou cujas saídas sumiram.
+
+Para dividir um lote entre vários nós, enfileire os vídeos numa fila compartilhada
+(work_queue.py) e rode um worker em cada nó. Cada worker reserva um vídeo por vez
+e executa nele a cadeia de etapas da tarefa (ver QUEUE_TASKS).
+
+Exemplos:
+    python pipeline.py download
+    python pipeline.py upload-parts --with-deps
+    python pipeline.py all
+    python pipeline.py enqueue segment --queue /shared/queue.db
+    python pipeline.py worker segment --queue /shared/queue.db
+"""
+import os
+import json
+import socket
+import sqlite3
+import hashlib
+import logging
+import argparse
+from collections import Counter
+from time import time, sleep
+from contextlib import closing
+
+import script
+import cut_videos_with_faces as faces
+from downloads_index import build_downloads_index, youtube_id_from_url
+from logging_setup import setup_logging
+from work_queue import WorkQueue, keep_lease
+
+STATE_FILE = 'pipeline_state.db'
+
+# Parâmetros usados por segment_video; mudá-los invalida as partes já geradas
+SEGMENT_PARAMS = {
+    'interval_sec': faces.FRAME_INTERVAL_SEC, 'min_length': faces.MIN_FACE_FRAMES,
+    'max_length': faces.MAX_PART_FRAMES, 'width': faces.PART_WIDTH, 'height': faces.PART_HEIGHT,
+    'cut_mode': faces.CUT_MODE, 'keyframe_tolerance': faces.KEYFRAME_TOLERANCE,
+}
+
+# Cadeias de etapas executadas por vídeo pelos workers da fila. As etapas que
+# reescrevem links.csv (metadata, verify) ficam de fora e rodam num único nó.
+QUEUE_TASKS = {
+    'download': ['download', 'rename', 'upload'],
+    'segment': ['segment', 'upload-parts'],
+}
+QUEUE_FILE = 'work_queue.db'
+QUEUE_POLL_SECONDS = 30
+
+
+class PipelineState:
+    """Registros por etapa/item numa base SQLite.
+
+    Cada item é gravado sozinho e o SQLite cuida dos locks, então vários workers
+    podem usar a mesma base (mesmo diretório ou volume compartilhado).
+    """
+
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS records (
+                    stage TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    record TEXT NOT NULL,
+                    PRIMARY KEY (stage, key)
+                )
+            """)
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=30))
+
+    def get(self, stage, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT record FROM records WHERE stage = ? AND key = ?", (stage, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, stage, key, record):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO records (stage, key, record) VALUES (?, ?, ?)",
+                (stage, key, json.dumps(record, ensure_ascii=False)),
+            )
+            conn.commit()
+
+    def records(self, stage):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT key, record FROM records WHERE stage = ?", (stage,)).fetchall()
+        for key, record in rows:
+            yield key, json.loads(record)
+
+def make_fingerprint(inputs):
+    data = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+# === Itens de cada etapa ===
+
+def modified_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class VideoLookup:
+    """Metadados (links.csv) e índice de downloads carregados uma vez por processo.
+
+    Os workers buscam um vídeo por vez pelo youtube_id; o CSV e a pasta de downloads
+    só são lidos de novo quando o vídeo não é encontrado e o arquivo/pasta mudou.
+    """
+
+    def __init__(self, csv_file=script.CSV_FILE, folder=script.DOWNLOADS_PATH):
+        self.csv_file = csv_file
+        self.folder = folder
+        self._load_metadata()
+
+    def _load_metadata(self):
+        self._csv_mtime = modified_ns(self.csv_file)
+        self._videos = {
+            youtube_id_from_url(video_data['url']): video_data
+            for video_data in script.list_metadata(self.csv_file)
+        }
+        self._duplicated = None
+        self._load_downloads()
+
+    def _load_downloads(self):
+        self._folder_mtime = modified_ns(self.folder)
+        self._downloads = build_downloads_index(self._videos.values(), self.folder)
+
+    def refresh(self):
+        """Relê o CSV e/ou a pasta de downloads se mudaram desde a última leitura."""
+        if modified_ns(self.csv_file) != self._csv_mtime:
+            self._load_metadata()
+        elif modified_ns(self.folder) != self._folder_mtime:
+            self._load_downloads()
+
+    def duplicated(self):
+        """Títulos usados por mais de um vídeo (calculado só quando necessário)."""
+        if self._duplicated is None:
+            titles = Counter(video_data['title'] for video_data in self._videos.values() if video_data['title'])
+            self._duplicated = {title for title, count in titles.items() if count > 1}
+        return self._duplicated
+
+    def _local_filename(self, youtube_id):
+        local_filename = self._downloads.get(youtube_id)
+        if local_filename and os.path.isfile(os.path.join(self.folder, local_filename)):
+            return local_filename
+        return None
+
+    def find(self, youtube_id):
+        """Retorna (video_data, local_filename); video_data é None se o vídeo não estiver no CSV."""
+        if youtube_id not in self._videos or not self._local_filename(youtube_id):
+            self.refresh()
+        return self._videos.get(youtube_id), self._local_filename(youtube_id)
+
+    def iter_videos(self, videos=None):
+        """Gera (youtube_id, video_data, local_filename) de todos os vídeos ou só dos informados."""
+        if videos is None:
+            self.refresh()
+            videos = list(self._videos)
+        for youtube_id in videos:
+            video_data, local_filename = self.find(youtube_id)
+            if video_data is not None:
+                yield youtube_id, video_data, local_filename
+
+def ingest_items(state, lookup, videos=None):
+    path = script.SPREADSHEET_FILE
+    if not os.path.isfile(path):
+        logging.warning(f"Spreadsheet not found: {path}")
+        return
+    # A janela do TTL entra nas entradas para reexpandir as playlists periodicamente
+    ttl_window = int(time() // script.PLAYLIST_CACHE_TTL)
+    yield {'key': path, 'inputs': [file_signature(path), ttl_window], 'payload': path}
+
+def ingest_run(path):
+    return [script.ingest_links(path)]
+
+def metadata_items(state, lookup, videos=None):
+    existing_urls = set(script.get_links())
+    for row in script.list_ingested():
+        if row['url'] not in existing_urls:
+            yield {'key': row['url'], 'inputs': row, 'payload': row}
+
+def metadata_run(row):
+    script.fetch_metadata(row['id'], row['url'], row['playlist'])
+    return []
+
+def download_items(state, lookup, videos=None):
+    for youtube_id, video_data, local_filename in lookup.iter_videos(videos):
+        yield {'key': youtube_id, 'inputs': video_data['url'], 'payload': (video_data, local_filename)}
+
+def download_run(payload):
+    local_path = script.download_missing_video(*payload)
+    return [local_path] if local_path else None
+
+def rename_items(state, lookup, videos=None):
+    for youtube_id, video_data, local_filename in lookup.iter_videos(videos):
+        if local_filename and youtube_id not in local_filename:
+            inputs = [local_filename, video_data['title']]
+            yield {'key': youtube_id, 'inputs': inputs, 'payload': (video_data, local_filename, lookup.duplicated())}
+
+def rename_run(payload):
+    local_path = script.rename_downloaded_file(*payload)
+    return [local_path] if local_path else None
+
+def verify_items(state, lookup, videos=None):
+    for youtube_id, video_data, local_filename in lookup.iter_videos(videos):
+        yield {'key': youtube_id, 'inputs': local_filename, 'payload': (video_data, local_filename)}
+
+def verify_run(payload):
+    script.mark_downloaded(*payload)
+    return []
+
+def upload_items(state, lookup, videos=None):
+    for youtube_id, video_data, local_filename in lookup.iter_videos(videos):
+        if local_filename:
+            local_path = f'{script.DOWNLOADS_PATH}/{local_filename}'
+            inputs = [video_data['id'], local_filename, file_signature(local_path)]
+            yield {'key': youtube_id, 'inputs': inputs, 'payload': (video_data, local_filename)}
+
+def upload_run(payload):
+    return [] if script.upload_video(*payload) else None
+
+def segment_items(state, lookup, videos=None):
+    for youtube_id, video_data, local_filename in lookup.iter_videos(videos):
+        if local_filename:
+            local_path = f'{script.DOWNLOADS_PATH}/{local_filename}'
+            inputs = [video_data['id'], local_filename, file_signature(local_path), SEGMENT_PARAMS]
+            yield {'key': youtube_id, 'inputs': inputs, 'payload': (video_data, local_filename)}
+
+def segment_run(payload):
+    return faces.segment_video(*payload)
+
+def upload_parts_items(state, lookup, videos=None):
+    if videos is None:
+        records = state.records('segment')
+    else:
+        records = ((youtube_id, state.get('segment', youtube_id)) for youtube_id in videos)
+    for youtube_id, record in records:
+        for part_path in (record or {}).get('outputs', []):
+            if os.path.isfile(part_path):
+                yield {'key': part_path, 'inputs': file_signature(part_path), 'payload': part_path}
+
+def upload_parts_run(part_path):
+    return [] if faces.upload_part(part_path) else None
+
+
+STAGES = {
+    'ingest': {
+        'deps': [], 'items': ingest_items, 'run': ingest_run,
+        'help': 'Read the spreadsheet and expand playlists',
+    },
+    'metadata': {
+        'deps': ['ingest'], 'items': metadata_items, 'run': metadata_run,
+        'help': 'Fetch title and length of new videos',
+    },
+    'download': {
+        'deps': ['metadata'], 'items': download_items, 'run': download_run,
+        'help': 'Download missing videos',
+    },
+    'rename': {
+        'deps': ['download'], 'items': rename_items, 'run': rename_run,
+        'help': 'Append the YouTube id to downloaded filenames',
+    },
+    'verify': {
+        'deps': ['rename'], 'items': verify_items, 'run': verify_run,
+        'help': 'Mark downloaded videos in the metadata CSV',
+    },
+    'upload': {
+        'deps': ['verify'], 'items': upload_items, 'run': upload_run,
+        'help': 'Upload full videos to S3',
+    },
+    'segment': {
+        'deps': ['verify'], 'items': segment_items, 'run': segment_run,
+        'help': 'Cut and resize the parts with faces',
+    },
+    'upload-parts': {
+        'deps': ['segment'], 'items': upload_parts_items, 'run': upload_parts_run,
+        'help': 'Upload video parts to S3',
+    },
+}
+
+
+def resolve_stages(names, with_deps=False):
+    """Retorna as etapas em ordem topológica, incluindo as dependências se pedido."""
+    ordered = []
+
+    def visit(name):
+        if name in ordered:
+            return
+        if with_deps:
+            for dep in STAGES[name]['deps']:
+                visit(dep)
+        ordered.append(name)
+
+    for name in STAGES:
+        if name in names:
+            visit(name)
+    return ordered
+
+def run_stage(name, state, lookup, force=False, videos=None):
+    """Executa os itens da etapa que mudaram. `videos` limita aos youtube_ids informados.
+
+    Retorna a contagem de itens concluídos, pulados e com falha.
+    """
+    stage = STAGES[name]
+    done = skipped = failed = 0
+    logging.info(f"[{name}] Starting")
+    for item in stage['items'](state, lookup, videos):
+        fingerprint = make_fingerprint(item['inputs'])
+        record = state.get(name, item['key'])
+        if (not force
+            and record
+            and record['fingerprint'] == fingerprint
+            and all(os.path.exists(path) for path in record['outputs'])
+            ):
+            skipped += 1
+            continue
+
+        try:
+            outputs = stage['run'](item['payload'])
+        except Exception as e:
+            logging.error(f"[{name}] Error {item['key']}: {str(e)}")
+            outputs = None
+
+        if outputs is None:
+            failed += 1
+            continue
+        state.put(name, item['key'], {'fingerprint': fingerprint, 'outputs': list(outputs), 'finished_at': time()})
+        done += 1
+    logging.info(f"[{name}] Done: {done} | Skipped: {skipped} | Failed: {failed}")
+    return {'done': done, 'skipped': skipped, 'failed': failed}
+
+def enqueue_videos(task, queue, lookup):
+    added = 0
+    for youtube_id, video_data, local_filename in lookup.iter_videos():
+        if queue.enqueue(task, youtube_id, video_data):
+            added += 1
+    logging.info(f"[{task}] Enqueued: {added} | Queue: {queue.counts(task)}")
+
+def run_worker(task, queue, state, lookup, worker_id, force=False):
+    """Reserva vídeos da fila até ela esvaziar, rodando a cadeia de etapas de `task` em cada um."""
+    stages = QUEUE_TASKS[task]
+    logging.info(f"[{task}] Worker {worker_id} started")
+    while True:
+        item = queue.claim(task, worker_id)
+        if item is None:
+            counts = queue.counts(task)
+            if not counts.get('pending') and not counts.get('leased'):
+                break
+            # Itens em retry ou com outros workers: espera leases expirarem
+            sleep(QUEUE_POLL_SECONDS)
+            continue
+
+        logging.info(f"[{task}] Claimed {item['key']} (attempt {item['attempts']})")
+        error = None
+        lease_lost = False
+        try:
+            with keep_lease(queue, item, worker_id) as lost:
+                for position, name in enumerate(stages):
+                    if lost.is_set():
+                        # Outro worker reservou o vídeo: não roda as etapas em dobro
+                        lease_lost = True
+                        break
+                    result = run_stage(name, state, lookup, force=force, videos=[item['key']])
+                    if position == 0 and not any(result.values()):
+                        # Ex.: vídeo ainda não baixado neste nó; não pode contar como feito
+                        error = f'no {name} item for this video'
+                        break
+                    if result['failed']:
+                        error = f'stage {name} failed'
+                        break
+        except KeyboardInterrupt:
+            queue.release(item, worker_id)
+            raise
+        except Exception as e:
+            error = str(e)
+
+        if lease_lost:
+            logging.warning(f"[{task}] Lease lost for {item['key']}; stopped before stage {name}")
+        elif error:
+            logging.error(f"[{task}] Failed {item['key']}: {error}")
+            if not queue.fail(item, worker_id, error):
+                logging.warning(f"[{task}] Could not record failure of {item['key']}: lease lost")
+        elif not queue.complete(item, worker_id):
+            logging.warning(f"[{task}] Could not complete {item['key']}: lease lost, another worker may redo it")
+    logging.info(f"[{task}] Worker {worker_id} finished. Queue: {queue.counts(task)}")
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--with-deps', action='store_true', help='run upstream stages first')
+    common.add_argument('--force', action='store_true', help='ignore the saved state and re-run every item')
+    common.add_argument('--state', default=STATE_FILE, help=f'state file (default: {STATE_FILE})')
+    common.add_argument('--verbose', action='store_true', help='log every frame and download chunk')
+
+    parser = argparse.ArgumentParser(description='Video dataset pipeline')
+    subparsers = parser.add_subparsers(dest='stage', required=True)
+    for name, stage in STAGES.items():
+        subparsers.add_parser(name, parents=[common], help=stage['help'])
+    subparsers.add_parser('all', parents=[common], help='Run every stage in dependency order')
+
+    queue_options = argparse.ArgumentParser(add_help=False)
+    queue_options.add_argument('task', choices=QUEUE_TASKS, help='stage chain run for each video')
+    queue_options.add_argument('--queue', default=QUEUE_FILE, help=f'shared queue database (default: {QUEUE_FILE})')
+    subparsers.add_parser('enqueue', parents=[common, queue_options], help='Add every video to the shared work queue')
+    worker = subparsers.add_parser('worker', parents=[common, queue_options], help='Process videos claimed from the shared work queue')
+    worker.add_argument('--worker-id', default=f'{socket.gethostname()}-{os.getpid()}')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    setup_logging(verbose=args.verbose)
+
+    if args.stage == 'enqueue':
+        enqueue_videos(args.task, WorkQueue(args.queue), VideoLookup())
+        return 0
+    if args.stage == 'worker':
+        run_worker(args.task, WorkQueue(args.queue), PipelineState(args.state), VideoLookup(),
+                   args.worker_id, force=args.force)
+        return 0
+
+    if args.stage == 'all':
+        stages = resolve_stages(STAGES, with_deps=True)
+    else:
+        stages = resolve_stages([args.stage], with_deps=args.with_deps)
+
+    state = PipelineState(args.state)
+    lookup = VideoLookup()
+    ok = True
+    for name in stages:
+        ok = run_stage(name, state, lookup, force=args.force)['failed'] == 0 and ok
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,11 +1,12 @@
 import os
 import csv
-from time import sleep
-from datetime import datetime
+import json
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import sleep, time
 import logging
-from pathlib import Path
 
-import pandas as pd
 from openpyxl import load_workbook
 from pytubefix import YouTube, Playlist
 from pytubefix.cli import on_progress
@@ -14,30 +15,22 @@ import boto3
 from botocore.exceptions import ClientError
 from decouple import config
 
-DOWNLOADS_PATH = 'downloads'
-
-# === Configuração de Logging ===
-
-# Cria diretório de logs (se não existir)
-os.makedirs("logs", exist_ok=True)
+from downloads_index import safe_title, youtube_id_from_url
+from logging_setup import ProgressLog, verbose_log
 
-# Gera nome do arquivo de log com data e hora atual
-log_filename = datetime.now().strftime("logs/%Y-%m-%d_%H-%M-%S.log")
-
-# Configuração de logging com arquivo separado por execução
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    handlers=[
-        logging.FileHandler(log_filename, mode='a', encoding='utf-8'),
-        logging.StreamHandler()
-    ],
-    force=True 
-)
+DOWNLOADS_PATH = 'downloads'
 
 # Nome do arquivo CSV
 CSV_FILE = 'links.csv'  # ajuste para o nome do seu arquivo
+SPREADSHEET_FILE = 'Copy of Pregnant Face Dataset.xlsx'
+
+# Cache das playlists expandidas (evita buscar de novo playlists inalteradas)
+PLAYLIST_CACHE_FILE = 'playlists_cache.json'
+PLAYLIST_CACHE_TTL = 24 * 60 * 60  # segundos
+PLAYLIST_WORKERS = 4
+
+# Saída da ingestão: uma linha por vídeo (playlists já expandidas)
+INGEST_FILE = 'links_input.csv'
 
 def update_csv(video_data):
     """Atualiza ou adiciona a linha do CSV com base em video_data['url']."""
@@ -66,38 +59,107 @@ def update_csv(video_data):
         writer.writerows(rows)
 
 def extrair_links_com_ids(arquivo_xlsx):
+    """Lê a planilha em modo streaming (read_only) e gera {'id', 'link'} por linha.
+
+    Erros de leitura e a falta da coluna 'LINK' são propagados: uma lista parcial
+    substituiria a ingestão anterior.
+    """
+    # Carrega o arquivo Excel sem materializar todas as células
+    wb = load_workbook(arquivo_xlsx, read_only=True)
     try:
-        # Carrega o arquivo Excel
-        wb = load_workbook(arquivo_xlsx)
         planilha = wb.active
-        
-        # Encontra a coluna 'LINK'
+        linhas = planilha.iter_rows(values_only=True)
+
+        # Encontra a coluna 'LINK' (qualquer coluna, inclusive 'AA', 'AB'...)
+        cabecalho = next(linhas, ())
         coluna_link = None
-        for cell in planilha[1]:  # Verifica a primeira linha (cabeçalho)
-            if cell.value and str(cell.value).strip().upper() == 'LINK':
-                coluna_link = cell.column_letter
+        for indice, valor in enumerate(cabecalho):
+            if valor and str(valor).strip().upper() == 'LINK':
+                coluna_link = indice
                 break
-        
-        if not coluna_link:
-            raise ValueError("Coluna 'LINK' não encontrada na planilha")
-        
+
+        if coluna_link is None:
+            raise ValueError(f"Coluna 'LINK' não encontrada na planilha {arquivo_xlsx}")
+
         # Extrai os dados
-        dados = []
-        for idx, row in enumerate(planilha.iter_rows(min_row=2, values_only=True), start=2):
-            link = row[ord(coluna_link.lower()) - ord('a')]  # Converte letra para índice
+        for idx, row in enumerate(linhas, start=2):
+            link = row[coluna_link] if coluna_link < len(row) else None
             if link:  # Ignora linhas vazias
-                dados.append({'id': idx, 'link': str(link)})
-        
-        return dados
-        
-    except Exception as e:
-        logging.error(f"Erro ao processar arquivo: {str(e)}")
-        return []
+                yield {'id': idx, 'link': str(link)}
+    finally:
+        wb.close()
 
 def extract_urls_from_playlist(url):
     pl = Playlist(url)
 
-    return pl.video_urls
+    return list(pl.video_urls)
+
+def load_playlist_cache(cache_file=PLAYLIST_CACHE_FILE):
+    if not os.path.isfile(cache_file):
+        return {}
+    try:
+        with open(cache_file, mode='r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Invalid playlist cache {cache_file}: {e}")
+        return {}
+
+def save_playlist_cache(cache, cache_file=PLAYLIST_CACHE_FILE):
+    # Temporário único no mesmo diretório: execuções simultâneas não se sobrescrevem
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_file)), suffix='.tmp')
+    with open(fd, mode='w', encoding='utf-8') as file:
+        json.dump(cache, file, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, cache_file)
+
+def expand_links(links, max_workers=PLAYLIST_WORKERS, cache_file=PLAYLIST_CACHE_FILE, ttl=PLAYLIST_CACHE_TTL):
+    """Expande as playlists em paralelo (pool limitado) e gera os links na ordem da planilha.
+
+    Cada item gerado é {'id', 'link', 'playlist', 'urls'}. Playlists buscadas há menos
+    de `ttl` segundos são lidas do cache em `cache_file`.
+    """
+    cache = load_playlist_cache(cache_file)
+    cache_changed = False
+    pending = deque()
+
+    def resolve(item, result):
+        nonlocal cache_changed
+        if isinstance(result, Future):
+            try:
+                urls = result.result()
+            except Exception as e:
+                # Propaga: sem os vídeos da playlist a ingestão ficaria incompleta
+                logging.error(f"Error expanding playlist {item['link']}: {str(e)}")
+                raise
+            cache[item['link']] = {'fetched_at': time(), 'urls': urls}
+            cache_changed = True
+            logging.info(f"Playlist Urls to download: {len(urls)} {item['link']}")
+        else:
+            urls = result
+        return {**item, 'urls': urls}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for item in links:
+                url = item['link']
+                if 'playlist?list' not in url:
+                    pending.append(({**item, 'playlist': None}, [url]))
+                else:
+                    cached = cache.get(url)
+                    if cached and time() - cached['fetched_at'] < ttl:
+                        result = cached['urls']
+                    else:
+                        result = executor.submit(extract_urls_from_playlist, url)
+                    pending.append(({**item, 'playlist': url}, result))
+
+                # Mantém no máximo 2x max_workers itens em espera
+                while len(pending) > max_workers * 2:
+                    yield resolve(*pending.popleft())
+
+            while pending:
+                yield resolve(*pending.popleft())
+    finally:
+        if cache_changed:
+            save_playlist_cache(cache, cache_file)
 
 def get_links(csv_file=CSV_FILE):
     all_urls = set()
@@ -130,33 +192,23 @@ def list_metadata(csv_file=CSV_FILE):
 
     return rows
 
-def retrieve_metadata_from_url(url, csv_file=CSV_FILE):
-    if os.path.isfile(csv_file):
-        with open(csv_file, mode='r', newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                if row.get('url') == url:
-                    video_metadata = {
-                        'id': row.get('id'),
-                        'url': row.get('url'),
-                        'title': row.get('title'),
-                        'playlist': row.get('playlist'),
-                        'length': row.get('length'),
-                        'downloaded': row.get('downloaded')
-                    }
-                    return video_metadata
-
 def download_video(url):
     # yt = YouTube(url, use_oauth=True, allow_oauth_cache=True, on_progress_callback=on_progress)
     # ys = yt.streams.get_highest_resolution()
     # ys.download(output_path=DOWNLOADS_PATH)
 
+    # Um log por chunk só com --verbose; senão, um resumo periódico
+    progress = ProgressLog(f"Downloading {url} ...")
+
+    def on_progress_callback(stream, chunk, bytes_remaining):
+        verbose_log.debug("Downloading %s ... %.2fMB remaining", url, bytes_remaining / (1024 * 1024))
+        progress.update(detail=lambda: f"{bytes_remaining / (1024 * 1024):.2f}MB remaining")
+
     yt = YouTube(
             url,
             use_oauth=True,
             allow_oauth_cache=True,
-            on_progress_callback=lambda stream, chunk, bytes_remaining: 
-                logging.info(f"Downloading {url} ... {bytes_remaining / (1024 * 1024):.2f}MB remaining"),
+            on_progress_callback=on_progress_callback,
             on_complete_callback=lambda stream, file_path: 
                 logging.info(f"Download completed: {file_path}")
         )
@@ -170,68 +222,25 @@ def download_video(url):
         return 'FAILED'
     return stream.download(output_path=DOWNLOADS_PATH)
 
-def get_metadata(input_url):
-    input_url_id = input_url['id']
-    input_url = input_url['link']
-    if 'playlist?list' in input_url:
-        urls = extract_urls_from_playlist(input_url)
-        logging.info(f'Playlist Urls to download: {len(urls)} {input_url}')
-        playlist = input_url
-    else:
-        urls = [input_url]
-        playlist = None
-    existing_urls = get_links()
-    for url in urls:
-        if url in existing_urls:
-            continue
-        yt = YouTube(url, use_oauth=True, allow_oauth_cache=True)
-        length = yt.length
-        title = yt.title
-
-        result = {
-            "id": input_url_id,
-            "url": url,
-            "title": title,
-            "playlist": playlist,
-            "length": length,
-            "downloaded": False
-        }
-        logging.info(result)
-        logging.info('\n')
-
-        update_csv(result)
-        sleep(5)
-
-def list_downloaded_files(folder=DOWNLOADS_PATH):
-    try:
-        folder = Path(folder).expanduser().absolute()
-        
-        if not folder.exists():
-            raise FileNotFoundError(f"Folder not found: {folder}")
-            
-        files = []
-        for item in folder.iterdir():
-            if item.is_file():
-                files.append(str(item).split('/')[-1])
-        
-        return files
-        
-    except Exception as e:
-        print(f"Error to list files: {str(e)}")
-        return []
-
-def find_duplicated(csv_file=CSV_FILE):
-    try:
-        df = pd.read_csv(csv_file)
-        if 'title' not in df.columns:
-            return []
-            
-        duplicated = df[df.duplicated('title', keep=False)]['title'].unique()
-        return list(duplicated)
-        
-    except Exception as e:
-        logging.info(f"Error: {str(e)}")
-        return []
+def fetch_metadata(input_url_id, url, playlist=None):
+    yt = YouTube(url, use_oauth=True, allow_oauth_cache=True)
+    length = yt.length
+    title = yt.title
+
+    result = {
+        "id": input_url_id,
+        "url": url,
+        "title": title,
+        "playlist": playlist,
+        "length": length,
+        "downloaded": False
+    }
+    logging.info(result)
+    logging.info('\n')
+
+    update_csv(result)
+    sleep(5)
+    return result
 
 s3 = boto3.client(
     's3',
@@ -290,101 +299,94 @@ def check_file_exists_s3(bucket_name, file_key):
             return False
         raise
 
-option = 6
-
-if option == 1:
-    # Get metadata
-    urls_to_download = extrair_links_com_ids('Copy of Pregnant Face Dataset.xlsx')
-    logging.info(f'Urls to download: {len(urls_to_download)}')
-    for new_url in urls_to_download:
-        get_metadata(new_url)
-    logging.info('\nFinished metadata!')
-
-elif option == 2:
-    # Rename files
-    downloaded = list_downloaded_files()
-    for video_data in list_metadata():
-        video_title = video_data['title']
-        if f"{video_title}.mp4" in downloaded and video_title not in find_duplicated():
-            video_id = video_data['url'].split('=')[-1]
-            if video_id not in video_title:
-                try:
-                    os.rename(f"downloads/{video_title}.mp4", f"downloads/{video_title} ({video_id}).mp4")
-                except FileNotFoundError as e:
-                    logging.warning(f"Not found {video_title}.mp4")
-
-elif option == 3:
-    # Check downloaded
-    downloaded = list_downloaded_files()
-    for video_data in list_metadata():
-        video_title = video_data['title']
-        video_id = video_data['url'].split('=')[-1]
-        if video_id in video_title:
-            if f"{video_title}.mp4" in downloaded:
-                video_data['downloaded'] = True
-                update_csv(video_data)
-        else:
-            if f"{video_title} ({video_id}).mp4" in downloaded:
-                video_data['downloaded'] = True
-                update_csv(video_data)
-
-elif option == 4:
-    # Rename Titles
-    for video_data in list_metadata():
-        video_title = video_data['title']
-        video_id = video_data['url'].split('=')[-1]
-        video_data['title'] = f"{video_title} ({video_id})"
-        update_csv(video_data)
+def ingest_links(arquivo_xlsx=SPREADSHEET_FILE, ingest_file=INGEST_FILE):
+    """Lê a planilha, expande as playlists e grava uma linha por vídeo em `ingest_file`.
 
-elif option ==5:
-    ## Download videos
-    for video_data in list_metadata():
-        video_title = video_data['title']
-        video_id = video_data['url'].split('=')[-1]
-        if video_data['downloaded'] == 'False':
-            file_path = download_video(video_data['url'])
-            if os.path.exists(file_path):
-                os.rename(f"downloads/{video_title}.mp4", f"downloads/{video_title} ({video_id}).mp4")
-                video_data['downloaded'] = True
-                logging.info(f'Saved: {video_data}')
-            else:
-                logging.info(f'Failed: {video_data}')
-            sleep(10)
-
-elif option == 6:
-    ## Upload to S3
-    jump = False # change to True to continue from last uploaded
-    for video_data in list_metadata():
-        s3_folder_name = video_data['id']
-        youtube_id = video_data['url'].split('=')[-1]
-        video_title = video_data['title']
-        if jump:
-            if f'{s3_folder_name}/{video_title} ({youtube_id})' == 'PASTE_LAST_UPLOADED':
-                jump = False 
-            continue
-        if youtube_id in video_title:
-            filename_s3 = f"{video_title}.mp4"
-        else:
-            filename_s3 = f"{video_title} ({youtube_id}).mp4"
-        if not s3_folder_exists(config('S3_BUCKET'), s3_folder_name):
-            create_s3_folder(config('S3_BUCKET'), s3_folder_name)
-        file_to_check = f"{s3_folder_name}/{video_title} ({youtube_id}).mp4"
-        logging.info(f'Checking: {file_to_check}')
-        if not check_file_exists_s3(config('S3_BUCKET'), file_to_check):
-            filename_local = f"{video_title} ({youtube_id}).mp4"
-            if not upload_file_to_s3(
-                config('S3_BUCKET'),
-                f'{DOWNLOADS_PATH}/{filename_local}',
-                f'{s3_folder_name}/{filename_s3}'
-            ):
-                filename_local = f"{video_title}.mp4"
-                if not upload_file_to_s3(
-                    config('S3_BUCKET'),
-                    f'{DOWNLOADS_PATH}/{filename_local}',
-                    f'{s3_folder_name}/{filename_s3}'
-                ):
-                    logging.warning(f"Not upload: Data ID: {s3_folder_name} YT_ID: {youtube_id} Title: {video_title} Url: {video_data['url']}")
-                    filename_local = f"{youtube_id}.mp4"
-                    upload_file_to_s3(config('S3_BUCKET'), f'{DOWNLOADS_PATH}/{filename_local}', f'{s3_folder_name}/{filename_s3}')
-
-            sleep(1)
+    Em caso de erro o arquivo anterior é mantido.
+    """
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(ingest_file)), suffix='.tmp')
+    total_urls = 0
+    try:
+        with open(fd, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=['id', 'url', 'playlist'])
+            writer.writeheader()
+            for link in expand_links(extrair_links_com_ids(arquivo_xlsx)):
+                for url in link['urls']:
+                    writer.writerow({'id': link['id'], 'url': url, 'playlist': link['playlist']})
+                    total_urls += 1
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+    os.replace(tmp_file, ingest_file)
+    logging.info(f'Urls to download: {total_urls}')
+    return ingest_file
+
+def list_ingested(ingest_file=INGEST_FILE):
+    """Gera as linhas de `ingest_file` uma a uma, sem carregar o arquivo inteiro."""
+    if not os.path.isfile(ingest_file):
+        return
+    with open(ingest_file, mode='r', newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            yield {'id': row['id'], 'url': row['url'], 'playlist': row['playlist'] or None}
+
+def download_missing_video(video_data, local_filename=None):
+    """Baixa o vídeo se ainda não estiver em downloads/ e retorna o caminho local."""
+    if local_filename:
+        return f'{DOWNLOADS_PATH}/{local_filename}'
+    video_title = video_data['title']
+    video_id = youtube_id_from_url(video_data['url'])
+    file_path = download_video(video_data['url'])
+    sleep(10)
+    if not os.path.exists(file_path):
+        logging.info(f'Failed: {video_data}')
+        return None
+    local_path = f"{DOWNLOADS_PATH}/{safe_title(video_title)} ({video_id}).mp4"
+    os.rename(file_path, local_path)
+    video_data['downloaded'] = True
+    logging.info(f'Saved: {video_data}')
+    return local_path
+
+def rename_downloaded_file(video_data, local_filename, duplicated=()):
+    """Renomeia "{title}.mp4" para "{title} ({youtube_id}).mp4" e retorna o novo caminho."""
+    video_title = video_data['title']
+    video_id = youtube_id_from_url(video_data['url'])
+    if video_id in local_filename or video_title in duplicated:
+        return f"{DOWNLOADS_PATH}/{local_filename}"
+    local_path = f"{DOWNLOADS_PATH}/{safe_title(video_title)} ({video_id}).mp4"
+    try:
+        os.rename(f"{DOWNLOADS_PATH}/{local_filename}", local_path)
+    except FileNotFoundError:
+        logging.warning(f"Not found {local_filename}")
+        return None
+    return local_path
+
+def mark_downloaded(video_data, local_filename):
+    if local_filename and video_data['downloaded'] != 'True':
+        video_data['downloaded'] = True
+        update_csv(video_data)
+    return True
+
+def upload_video(video_data, local_filename, bucket_name=None):
+    bucket_name = bucket_name or config('S3_BUCKET')
+    s3_folder_name = video_data['id']
+    youtube_id = youtube_id_from_url(video_data['url'])
+    video_title = video_data['title']
+    if youtube_id in video_title:
+        filename_s3 = f"{video_title}.mp4"
+    else:
+        filename_s3 = f"{video_title} ({youtube_id}).mp4"
+    if not s3_folder_exists(bucket_name, s3_folder_name):
+        create_s3_folder(bucket_name, s3_folder_name)
+    file_to_check = f"{s3_folder_name}/{video_title} ({youtube_id}).mp4"
+    logging.info(f'Checking: {file_to_check}')
+    if check_file_exists_s3(bucket_name, file_to_check):
+        return True
+    uploaded = bool(local_filename) and upload_file_to_s3(
+        bucket_name,
+        f'{DOWNLOADS_PATH}/{local_filename}',
+        f'{s3_folder_name}/{filename_s3}'
+    )
+    if not uploaded:
+        logging.warning(f"Not upload: Data ID: {s3_folder_name} YT_ID: {youtube_id} Title: {video_title} Url: {video_data['url']}")
+    sleep(1)
+    return uploaded
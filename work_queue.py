@@ -0,0 +1,174 @@
+"""Fila de trabalho com lease, para vários workers dividirem o mesmo lote de vídeos.
+
+Os itens ficam numa base SQLite compartilhada. Um worker faz `claim` de um item,
+renova o lease com `heartbeat` enquanto trabalha e no final chama `complete` ou
+`fail`. Itens cujo lease expira (worker parou ou caiu) voltam a ficar disponíveis
+para outro worker, até `max_attempts` tentativas.
+
+Obs.: o SQLite depende de locks de arquivo confiáveis. Para vários computadores,
+use um volume que os suporte (ou rode a fila num nó e exporte o arquivo por ele).
+"""
+import json
+import sqlite3
+import threading
+from time import time
+from contextlib import contextmanager
+
+LEASE_SECONDS = 10 * 60
+HEARTBEAT_SECONDS = 60
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 5 * 60  # segundos, multiplicado pelo número de tentativas
+
+
+class WorkQueue:
+    def __init__(self, path, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS items (
+                    task TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    payload TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL DEFAULT 0,
+                    lease_expires REAL,
+                    error TEXT,
+                    PRIMARY KEY (task, key)
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        # Uma conexão por operação: pode ser usada a partir de qualquer thread
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def enqueue(self, task, key, payload=None):
+        """Adiciona o item se ainda não existir. Retorna True se foi adicionado."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO items (task, key, payload) VALUES (?, ?, ?)",
+                (task, key, json.dumps(payload)),
+            )
+            return cursor.rowcount == 1
+
+    def claim(self, task, worker_id):
+        """Reserva o próximo item disponível (pendente ou com lease expirado)."""
+        now = time()
+        with self._connect() as conn:
+            # Leases expirados sem tentativas restantes viram falha
+            conn.execute(
+                """UPDATE items SET status = 'failed', worker = NULL, error = 'lease expired'
+                   WHERE task = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?""",
+                (task, now, self.max_attempts),
+            )
+            row = conn.execute(
+                """SELECT key, payload, attempts FROM items
+                   WHERE task = ? AND available_at <= ?
+                     AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                   ORDER BY rowid LIMIT 1""",
+                (task, now, now),
+            ).fetchone()
+            if row is None:
+                return None
+            key, payload, attempts = row
+            conn.execute(
+                """UPDATE items SET status = 'leased', worker = ?, attempts = attempts + 1, lease_expires = ?
+                   WHERE task = ? AND key = ?""",
+                (worker_id, now + self.lease_seconds, task, key),
+            )
+        return {'task': task, 'key': key, 'payload': json.loads(payload), 'attempts': attempts + 1}
+
+    def heartbeat(self, item, worker_id):
+        """Renova o lease. Retorna False se o item não pertence mais a este worker."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """UPDATE items SET lease_expires = ?
+                   WHERE task = ? AND key = ? AND worker = ? AND status = 'leased'""",
+                (time() + self.lease_seconds, item['task'], item['key'], worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, item, worker_id):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """UPDATE items SET status = 'done', lease_expires = NULL, error = NULL
+                   WHERE task = ? AND key = ? AND worker = ? AND status = 'leased'""",
+                (item['task'], item['key'], worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, item, worker_id, error=None):
+        """Devolve o item para nova tentativa (com atraso) ou marca como falha definitiva."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """UPDATE items SET
+                       status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                       available_at = ? + ? * attempts,
+                       worker = NULL, lease_expires = NULL, error = ?
+                   WHERE task = ? AND key = ? AND worker = ? AND status = 'leased'""",
+                (self.max_attempts, time(), self.retry_delay, error,
+                 item['task'], item['key'], worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, item, worker_id):
+        """Devolve o item sem contar a tentativa (ex.: worker encerrado)."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """UPDATE items SET status = 'pending', attempts = attempts - 1,
+                       worker = NULL, lease_expires = NULL
+                   WHERE task = ? AND key = ? AND worker = ? AND status = 'leased'""",
+                (item['task'], item['key'], worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def counts(self, task):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM items WHERE task = ? GROUP BY status", (task,)
+            ).fetchall()
+        return dict(rows)
+
+
+@contextmanager
+def keep_lease(queue, item, worker_id, interval=HEARTBEAT_SECONDS):
+    """Renova o lease do item numa thread em segundo plano enquanto o bloco executa.
+
+    Produz um Event que fica marcado se o lease for perdido (expirou e o item foi
+    reservado por outro worker); quem executa deve conferir e interromper o trabalho.
+    """
+    stop = threading.Event()
+    lost = threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            try:
+                if not queue.heartbeat(item, worker_id):
+                    lost.set()
+                    return
+            except sqlite3.Error:
+                # Falha temporária da base: tenta de novo no próximo intervalo
+                continue
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield lost
+    finally:
+        stop.set()
+        thread.join()